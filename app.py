@@ -1,14 +1,23 @@
 import streamlit as st
 import google.generativeai as genai
 from PIL import Image
+from sentence_transformers import SentenceTransformer
+import cv2
+import faiss
+import numpy as np
+import functools
+import hashlib
 import io
+import orjson
 import os
+import queue
+import re
+import sqlite3
+import tempfile
 import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
-import base64
-
-# Load environment variables
-load_dotenv()
 
 # Configure the page
 st.set_page_config(
@@ -17,37 +26,139 @@ st.set_page_config(
     layout="wide"
 )
 
-# Configure Gemini API
-def configure_gemini():
+# System prompt baked into the model as system_instruction so it is sent
+# once instead of being re-interpolated into every question
+SYSTEM_PROMPT = """You are a helpful AI assistant that can analyze images and answer questions about them.
+Be descriptive, accurate, and helpful in your responses. If you can't see something clearly in the image,
+please say so rather than guessing."""
+
+# Configure Gemini API once per process - every widget interaction reruns
+# the script, and rebuilding the SDK client each time is wasted work.
+# cache_resource swallows None, so a missing key raises instead.
+@st.cache_resource(show_spinner=False)
+def get_model():
+    load_dotenv()
     api_key = os.getenv("GEMINI_API_KEY")
     if not api_key:
-        st.error("❌ GEMINI_API_KEY not found in environment variables. Please check your .env file.")
-        st.stop()
-    
+        raise RuntimeError("GEMINI_API_KEY not found in environment variables. Please check your .env file.")
+
     genai.configure(api_key=api_key)
-    return genai.GenerativeModel('gemini-2.0-flash-exp')
+    return genai.GenerativeModel('gemini-2.0-flash-exp', system_instruction=SYSTEM_PROMPT)
 
 # Initialize the model
 try:
-    model = configure_gemini()
+    model = get_model()
+except RuntimeError as e:
+    st.error(f"❌ {str(e)}")
+    st.stop()
 except Exception as e:
     st.error(f"❌ Failed to configure Gemini API: {str(e)}")
     st.stop()
 
+# Single local user; the session_id column is kept so the schema can grow
+# to multiple sessions later
+SESSION_ID = "default"
+
+
+# SQLite connection shared across reruns - history and cached answers
+# survive server restarts and hard refreshes
+@st.cache_resource(show_spinner=False)
+def _db():
+    conn = sqlite3.connect('sessions.db', check_same_thread=False)
+    conn.execute("CREATE TABLE IF NOT EXISTS turns(session_id TEXT, ts TEXT, image_sha TEXT, question TEXT, answer TEXT, rt REAL)")
+    conn.execute("CREATE TABLE IF NOT EXISTS cache(key TEXT PRIMARY KEY, answer TEXT)")
+    conn.commit()
+    return conn
+
+
+def _persist_turn(image_sha, entry):
+    conn = _db()
+    conn.execute(
+        "INSERT INTO turns VALUES(?, ?, ?, ?, ?, ?)",
+        (SESSION_ID, entry["timestamp"], image_sha, entry["question"], entry["answer"], entry["response_time"])
+    )
+    conn.commit()
+
+
+def _load_history():
+    rows = _db().execute(
+        "SELECT ts, question, answer, rt FROM turns WHERE session_id=? ORDER BY rowid",
+        (SESSION_ID,)
+    ).fetchall()
+    return [
+        {
+            "question": question,
+            "answer": answer,
+            "response_time": rt,
+            "time_to_first_token": None,
+            "timestamp": ts
+        }
+        for ts, question, answer, rt in rows
+    ]
+
+
+def _cache_db_key(image_sha, question, temperature, top_k):
+    return hashlib.sha256(f"{image_sha}|{question}|{temperature}|{top_k}".encode()).hexdigest()
+
+
 # Initialize session state
 if "conversation_history" not in st.session_state:
-    st.session_state.conversation_history = []
+    st.session_state.conversation_history = _load_history()
 if "current_image" not in st.session_state:
     st.session_state.current_image = None
-if "current_image_base64" not in st.session_state:
-    st.session_state.current_image_base64 = None
+if "current_image_jpeg" not in st.session_state:
+    st.session_state.current_image_jpeg = None
+if "current_image_sha" not in st.session_state:
+    st.session_state.current_image_sha = None
+if "current_image_handle" not in st.session_state:
+    st.session_state.current_image_handle = None
+if "chat" not in st.session_state:
+    st.session_state.chat = None
+if "chat_image_sha" not in st.session_state:
+    st.session_state.chat_image_sha = None
+
+# JPEG encode parameters, pinned for the fast path: quality 85 is visually
+# transparent for photos, optimize/progressive stay off because their extra
+# encoder passes cost time without helping here, and 4:2:0 chroma
+# subsampling halves the chroma planes (what most web images ship anyway),
+# shrinking the buffer sent to Gemini with imperceptible quality loss.
+JPEG_ENCODE_PARAMS = [
+    int(cv2.IMWRITE_JPEG_QUALITY), 85,
+    int(cv2.IMWRITE_JPEG_OPTIMIZE), 0,
+    int(cv2.IMWRITE_JPEG_PROGRESSIVE), 0,
+    int(cv2.IMWRITE_JPEG_SAMPLING_FACTOR), int(cv2.IMWRITE_JPEG_SAMPLING_FACTOR_420),
+]
+
+
+# Helper function to encode an image as JPEG bytes
+# OpenCV's imencode uses libjpeg-turbo's SIMD paths, which is noticeably
+# faster than Pillow's JPEG encoder for typical photos
+def encode_jpeg(image):
+    arr = cv2.cvtColor(np.asarray(image), cv2.COLOR_RGB2BGR)
+    ok, buf = cv2.imencode('.jpg', arr, JPEG_ENCODE_PARAMS)
+    if not ok:
+        raise ValueError("JPEG encoding failed")
+    return buf.tobytes()
+
+
+# Gemini's vision encoder works on tiles up to this size on the long edge;
+# anything larger just costs extra image tokens and prefill time
+MAX_IMAGE_DIMENSION = 1568
+
+
+# Upload the encoded JPEG to Gemini's Files API and return the file
+# handle. The handle is referenced by the chat session, so the image
+# bytes cross the wire exactly once per upload rather than once per
+# question. upload_file wants a path, hence the short-lived temp file.
+def _upload_to_gemini(jpeg_bytes):
+    with tempfile.NamedTemporaryFile(suffix='.jpg', delete=False) as tmp:
+        tmp.write(jpeg_bytes)
+        tmp_path = tmp.name
+    try:
+        return genai.upload_file(tmp_path, mime_type='image/jpeg')
+    finally:
+        os.unlink(tmp_path)
 
-# Helper function to convert image to base64
-def image_to_base64(image):
-    buffered = io.BytesIO()
-    image.save(buffered, format="JPEG")
-    img_str = base64.b64encode(buffered.getvalue()).decode()
-    return img_str
 
 # Helper function to process image
 def process_uploaded_image(uploaded_file):
@@ -56,20 +167,267 @@ def process_uploaded_image(uploaded_file):
         if uploaded_file.size > 10 * 1024 * 1024:
             st.error("❌ File size too large. Please upload an image smaller than 10MB.")
             return None
-        
+
+        # Hash the raw upload bytes once, before any decode - this sha keys
+        # both the exact and semantic caches, and hashing the original
+        # bytes avoids re-encoding pixels just to derive a key
+        raw = uploaded_file.getvalue()
+        sha = hashlib.sha256(raw).hexdigest()
+
+        # The uploader keeps its file across reruns (every Ask submit is
+        # one), so the same bytes come back here repeatedly - reuse the
+        # already-processed image and JPEG buffer instead of re-running
+        # decode, thumbnail and encode
+        if (sha == st.session_state.current_image_sha
+                and st.session_state.current_image is not None
+                and st.session_state.current_image_jpeg is not None):
+            return st.session_state.current_image, st.session_state.current_image_jpeg
+
+        st.session_state.current_image_sha = sha
+
         # Open and process image
-        image = Image.open(uploaded_file)
-        
+        image = Image.open(io.BytesIO(raw))
+        original_size = image.size
+
+        # Let libjpeg downsample in the DCT domain at decode time - much
+        # cheaper than decoding at full resolution and resizing afterwards
+        image.draft('RGB', (MAX_IMAGE_DIMENSION, MAX_IMAGE_DIMENSION))
+
         # Convert to RGB if necessary
         if image.mode != 'RGB':
             image = image.convert('RGB')
-        
-        return image
+
+        # Clamp the long edge so oversize uploads don't inflate latency
+        # and image-token cost
+        if max(image.size) > MAX_IMAGE_DIMENSION:
+            image.thumbnail((MAX_IMAGE_DIMENSION, MAX_IMAGE_DIMENSION), Image.Resampling.LANCZOS)
+        if image.size != original_size:
+            st.info(f"📉 Resized image from {original_size[0]}x{original_size[1]} to {image.size[0]}x{image.size[1]} pixels for faster processing")
+
+        # Encode to JPEG once here; later consumers reuse this buffer
+        # instead of re-encoding the pixels
+        return image, encode_jpeg(image)
     except Exception as e:
         st.error(f"❌ Error processing image: {str(e)}")
         return None
 
 
+# Minimum cosine similarity for a semantic cache hit
+SEMANTIC_SIM_THRESHOLD = 0.92
+
+
+# Local embedding model for the semantic cache - loaded once per process
+@st.cache_resource(show_spinner=False)
+def _embedder():
+    return SentenceTransformer('all-MiniLM-L6-v2')
+
+
+# Per-image semantic cache: a FAISS index over question embeddings plus a
+# parallel list of (question, answer, temperature, top_k) entries, kept in
+# session state. The params ride along so a near-duplicate question asked
+# under different slider settings is a miss, not a stale hit.
+def _semantic_cache(image_sha):
+    key = f"semcache_{image_sha}"
+    if key not in st.session_state:
+        index = faiss.IndexFlatIP(_embedder().get_sentence_embedding_dimension())
+        st.session_state[key] = (index, [])
+    return st.session_state[key]
+
+
+_WHITESPACE_RE = re.compile(r'\s+')
+
+
+# Normalize a question for exact-cache lookups: collapse whitespace,
+# lowercase and strip trailing punctuation so "What is this?", "what is
+# this" and "what is this  " all share one cache entry. The original
+# string is still what gets sent to the model and shown in history.
+def _norm(q: str) -> str:
+    return _WHITESPACE_RE.sub(' ', q.strip().lower()).rstrip('?.!')
+
+
+# Process-wide exact-match cache: (image sha, question, params) -> answer,
+# LRU-bounded so it can't grow unchecked for the life of the process
+EXACT_CACHE_MAX_ENTRIES = 256
+
+
+@st.cache_resource(show_spinner=False)
+def _exact_cache():
+    return OrderedDict()
+
+
+def _exact_cache_get(key):
+    cache = _exact_cache()
+    answer = cache.get(key)
+    if answer is not None:
+        cache.move_to_end(key)
+    return answer
+
+
+def _exact_cache_put(key, answer):
+    cache = _exact_cache()
+    cache[key] = answer
+    cache.move_to_end(key)
+    while len(cache) > EXACT_CACHE_MAX_ENTRIES:
+        cache.popitem(last=False)
+
+
+# Worker pool for Gemini calls, shared across reruns
+@st.cache_resource(show_spinner=False)
+def _pool():
+    return ThreadPoolExecutor(max_workers=4)
+
+
+# Runs on a pool thread: drain the streaming response into the queue so
+# the Streamlit script thread stays free to update the UI. A None sentinel
+# marks completion; exceptions are forwarded for the main thread to raise.
+def _stream_worker(chat, question, generation_config, chunks):
+    try:
+        response = chat.send_message(
+            question,
+            generation_config=generation_config,
+            stream=True
+        )
+        for chunk in response:
+            if chunk.text:
+                chunks.put(chunk.text)
+        chunks.put(None)
+    except Exception as e:
+        chunks.put(e)
+
+
+# Rolling history window: beyond HISTORY_MAX_TURNS entries, everything but
+# the newest HISTORY_KEEP_TURNS is collapsed into one summary entry
+HISTORY_MAX_TURNS = 20
+HISTORY_KEEP_TURNS = 10
+
+
+# Collapse older turns into a single summary so per-session memory and the
+# rerun render cost stay O(HISTORY_KEEP_TURNS) on long conversations
+def _compact_history():
+    history = st.session_state.conversation_history
+    if len(history) <= HISTORY_MAX_TURNS:
+        return
+    old = history[:-HISTORY_KEEP_TURNS]
+    summary = model.generate_content(
+        "Summarize these Q&A turns in 5 bullets:\n" + orjson.dumps(old).decode()
+    ).text
+    history[:] = [{
+        "question": "(summary of earlier conversation)",
+        "answer": summary,
+        "response_time": 0.0,
+        "time_to_first_token": None,
+        "timestamp": "—",
+        "is_summary": True
+    }] + history[-HISTORY_KEEP_TURNS:]
+
+
+# Memoized GenerationConfig - users change the question far more often
+# than the sliders, so the common case skips SDK attribute validation
+@functools.lru_cache(maxsize=32)
+def _gen_cfg(temperature: float, top_k: int, max_tokens: int = 1024):
+    return genai.types.GenerationConfig(
+        temperature=temperature,
+        top_k=top_k,
+        max_output_tokens=max_tokens,
+    )
+
+
+# Answer a question about the current image. Repeat questions are served
+# from the exact cache (L1), near-duplicate phrasings from the semantic
+# cache (L2), and only true misses pay a full API round-trip - those are
+# streamed into `placeholder` chunk by chunk so the user sees output at
+# first-token time instead of waiting for the full response.
+# Returns (answer, time_to_first_token); the latter is None on cache hits.
+def _generate_answer(image_sha, question, temperature, top_k, placeholder):
+    cache_key = (image_sha, _norm(question), temperature, top_k)
+    answer = _exact_cache_get(cache_key)
+    if answer is not None:
+        placeholder.markdown(answer)
+        return answer, None
+
+    # Persistent exact cache - survives server restarts
+    db_key = _cache_db_key(image_sha, _norm(question), temperature, top_k)
+    row = _db().execute("SELECT answer FROM cache WHERE key=?", (db_key,)).fetchone()
+    if row is not None:
+        answer = row[0]
+        _exact_cache_put(cache_key, answer)
+        placeholder.markdown(answer)
+        return answer, None
+
+    index, entries = _semantic_cache(image_sha)
+    vec = _embedder().encode([question], normalize_embeddings=True)
+    if index.ntotal > 0:
+        # Check a few nearest neighbours: the same phrasing may be stored
+        # under several slider settings, and only a hit generated with the
+        # current params may be served - otherwise the sliders would
+        # silently stop mattering
+        D, I = index.search(vec, min(index.ntotal, 5))
+        for sim, idx in zip(D[0], I[0]):
+            if sim <= SEMANTIC_SIM_THRESHOLD:
+                break
+            _, answer, hit_temperature, hit_top_k = entries[idx]
+            if (hit_temperature, hit_top_k) == (temperature, top_k):
+                _exact_cache_put(cache_key, answer)
+                placeholder.markdown(answer)
+                return answer, None
+
+    generation_config = _gen_cfg(temperature, top_k)
+    # The chat session already holds the image as its first turn and the
+    # system prompt lives in the model's system_instruction, so only the
+    # question text goes over the wire here. The call runs on a pool
+    # thread and streams chunks back through a queue so the script thread
+    # keeps the status label and placeholder responsive.
+    start_time = time.time()
+    chunks = queue.Queue()
+    _pool().submit(_stream_worker, st.session_state.chat, question, generation_config, chunks)
+
+    status = st.status("🤖 AI is thinking...")
+    first_token_time = None
+    buf = []
+    while True:
+        try:
+            item = chunks.get(timeout=0.1)
+        except queue.Empty:
+            status.update(label=f"🤖 AI is thinking... {time.time() - start_time:.1f}s")
+            continue
+        if item is None:
+            break
+        if isinstance(item, Exception):
+            status.update(label="❌ Generation failed", state="error")
+            raise item
+        if first_token_time is None:
+            first_token_time = time.time() - start_time
+        buf.append(item)
+        placeholder.markdown("".join(buf))
+    status.update(label=f"✅ Done in {time.time() - start_time:.1f}s", state="complete")
+    answer = "".join(buf)
+
+    if answer:
+        _exact_cache_put(cache_key, answer)
+        conn = _db()
+        conn.execute("INSERT OR REPLACE INTO cache VALUES(?, ?)", (db_key, answer))
+        conn.commit()
+        index.add(vec)
+        entries.append((question, answer, temperature, top_k))
+    return answer, first_token_time
+
+
+
+# Uploaded-image preview - passing the JPEG bytes lets Streamlit hash them
+# and serve the same static URL across reruns instead of re-serializing the
+# PIL object, and the fragment keeps unrelated reruns (e.g. typing in the
+# question box) from touching this block at all
+@st.fragment
+def render_image_preview():
+    image = st.session_state.current_image
+    jpeg_bytes = st.session_state.current_image_jpeg
+    if image is None or jpeg_bytes is None:
+        return
+    st.image(jpeg_bytes, caption="Uploaded Image", width='stretch')
+
+    # Show image info
+    st.info(f"📊 Image Info: {image.size[0]}x{image.size[1]} pixels, {len(jpeg_bytes)/1024:.1f} KB")
+
 
 # Main app interface
 st.markdown("<h1 style='text-align: center;'>🤖 Multimodal Q&A Application</h1>", unsafe_allow_html=True)
@@ -88,19 +446,27 @@ with st.sidebar:
         # Top-k control
         top_k = st.slider("Top-K", 1, 40, 20, 1,
                          help="Number of top tokens to consider for generation")
+
+        # History summarization toggle
+        summarize_history = st.checkbox("Summarize older history", value=True,
+                                        help="Collapse old Q&A turns into a short summary to keep long conversations fast")
     
     # System prompt display
     with st.expander("📝 System Prompt", expanded=False):
-        system_prompt = """You are a helpful AI assistant that can analyze images and answer questions about them. 
-        Be descriptive, accurate, and helpful in your responses. If you can't see something clearly in the image, 
-        please say so rather than guessing."""
-        st.text_area("Current System Prompt", system_prompt, height=100, disabled=True, key="system_prompt_display")
+        st.text_area("Current System Prompt", SYSTEM_PROMPT, height=100, disabled=True, key="system_prompt_display")
     
     # Clear conversation button
     if st.button("🗑️ Clear Conversation"):
         st.session_state.conversation_history = []
+        conn = _db()
+        conn.execute("DELETE FROM turns WHERE session_id=?", (SESSION_ID,))
+        conn.commit()
         st.session_state.current_image = None
-        st.session_state.current_image_base64 = None
+        st.session_state.current_image_jpeg = None
+        st.session_state.current_image_sha = None
+        st.session_state.current_image_handle = None
+        st.session_state.chat = None
+        st.session_state.chat_image_sha = None
         st.rerun()
 
 # Main content area
@@ -118,101 +484,145 @@ with col1:
     
     if uploaded_file is not None:
         # Process the uploaded image
-        image = process_uploaded_image(uploaded_file)
-        
-        if image is not None:
+        processed = process_uploaded_image(uploaded_file)
+
+        if processed is not None:
+            image, jpeg_bytes = processed
+
             # Store current image in session state
             st.session_state.current_image = image
-            st.session_state.current_image_base64 = image_to_base64(image)
+            st.session_state.current_image_jpeg = jpeg_bytes
+
+            # Upload the image once via the Files API and start a chat
+            # session referencing the handle, so follow-up questions never
+            # re-send the image bytes. On failure, reset the image state so
+            # the Ask path can't run against a half-initialized session.
+            if st.session_state.chat_image_sha != st.session_state.current_image_sha:
+                try:
+                    handle = _upload_to_gemini(jpeg_bytes)
+                    st.session_state.current_image_handle = handle
+                    st.session_state.chat = model.start_chat(history=[{'role': 'user', 'parts': [handle]}])
+                    st.session_state.chat_image_sha = st.session_state.current_image_sha
+                except Exception as e:
+                    st.error(f"❌ Error uploading image to Gemini: {str(e)}")
+                    st.session_state.current_image = None
+                    st.session_state.current_image_jpeg = None
+                    st.session_state.current_image_sha = None
+                    st.session_state.current_image_handle = None
+                    st.session_state.chat = None
+                    st.session_state.chat_image_sha = None
             
             # Display the image
-            st.image(image, caption="Uploaded Image", width='stretch')
-            
-            # Show image info
-            st.info(f"📊 Image Info: {image.size[0]}x{image.size[1]} pixels, {uploaded_file.size/1024:.1f} KB")
+            render_image_preview()
         else:
             st.session_state.current_image = None
-            st.session_state.current_image_base64 = None
+            st.session_state.current_image_jpeg = None
+            st.session_state.current_image_sha = None
+            st.session_state.current_image_handle = None
+            st.session_state.chat = None
+            st.session_state.chat_image_sha = None
 
 with col2:
     st.subheader("💬 Ask Questions")
     
-    # Text input for questions
-    user_question = st.text_input(
-        "Enter your question about the image:",
-        placeholder="What do you see in this image?",
-        key="question_input"
-    )
-    
-    # Ask button - only enabled when there's text
-    ask_button = st.button("🤔 Ask", type="primary", disabled=not user_question.strip())
-    
-    if ask_button and user_question.strip():
-        with st.spinner("🤖 AI is thinking..."):
-            start_time = time.time()
-            
-            try:
-                # Check if image is available
-                if not st.session_state.current_image:
-                    st.warning("⚠️ No image uploaded. Please upload an image to ask questions about it.")
-                    st.stop()
-                
-                # Configure generation parameters
-                generation_config = genai.types.GenerationConfig(
-                    temperature=temperature,
-                    top_k=top_k,
-                    max_output_tokens=1024,
-                )
-                
-                # Create the prompt
-                full_prompt = f"{system_prompt}\n\nUser Question: {user_question.strip()}"
-                
-                # Generate response
-                response = model.generate_content(
-                    [full_prompt, st.session_state.current_image],
-                    generation_config=generation_config
-                )
-                
-                end_time = time.time()
-                response_time = end_time - start_time
-                
-                # Get the response text
-                if response.text:
-                    ai_response = response.text
-                    
-                    # Add to conversation history
-                    st.session_state.conversation_history.append({
-                        "question": user_question.strip(),
-                        "answer": ai_response,
-                        "response_time": response_time,
-                        "timestamp": time.strftime("%H:%M:%S")
-                    })
-                    
-                    # Display the response
-                    st.success("✅ Response generated successfully!")
-                    st.markdown(f"**AI Response:**")
-                    st.markdown(ai_response)
-                    
-                    # Show response time
-                    st.caption(f"⏱️ Response time: {response_time:.2f} seconds")
-                    
+    # The form defers the script rerun until submit, so typing in the
+    # question box no longer triggers a rerun per keystroke
+    with st.form("ask_form", clear_on_submit=False):
+        user_question = st.text_input(
+            "Enter your question about the image:",
+            placeholder="What do you see in this image?",
+            key="question_input"
+        )
+
+        submitted = st.form_submit_button("🤔 Ask", type="primary")
+
+    if submitted and user_question.strip():
+        start_time = time.time()
+
+        try:
+            # Check if image is available
+            if not st.session_state.current_image:
+                st.warning("⚠️ No image uploaded. Please upload an image to ask questions about it.")
+                st.stop()
+
+            # Belt and braces: the chat can be unset if the Files API
+            # upload failed after the image was processed
+            if st.session_state.chat is None:
+                st.warning("⚠️ The image wasn't uploaded to Gemini. Please re-upload it and try again.")
+                st.stop()
+
+            # Generate response, streaming chunks into the placeholder so
+            # the answer appears as soon as the first token arrives
+            st.markdown(f"**AI Response:**")
+            answer_placeholder = st.empty()
+            ai_response, first_token_time = _generate_answer(
+                st.session_state.current_image_sha,
+                user_question.strip(),
+                temperature,
+                top_k,
+                answer_placeholder
+            )
+
+            end_time = time.time()
+            response_time = end_time - start_time
+
+            # Get the response text
+            if ai_response:
+
+                # Add to conversation history
+                st.session_state.conversation_history.append({
+                    "question": user_question.strip(),
+                    "answer": ai_response,
+                    "response_time": response_time,
+                    "time_to_first_token": first_token_time,
+                    "timestamp": time.strftime("%H:%M:%S")
+                })
+                _persist_turn(st.session_state.current_image_sha, st.session_state.conversation_history[-1])
+                # Compaction makes its own Gemini call; the answer above is
+                # already streamed and persisted, so a summarization failure
+                # must not look like a failed answer
+                if summarize_history and len(st.session_state.conversation_history) > HISTORY_MAX_TURNS:
+                    try:
+                        with st.spinner("📜 Summarizing older history..."):
+                            _compact_history()
+                    except Exception as e:
+                        st.warning(f"⚠️ Couldn't summarize older history: {str(e)}")
+
+                # Show response time (and first-token latency when streamed)
+                st.success("✅ Response generated successfully!")
+                if first_token_time is not None:
+                    st.caption(f"⏱️ Response time: {response_time:.2f} seconds (first token: {first_token_time:.2f}s)")
                 else:
-                    st.error("❌ No response generated. Please try again.")
-                    
-            except Exception as e:
-                st.error(f"❌ Error generating response: {str(e)}")
-                st.caption("This might be due to API limits, network issues, or content policy violations.")
-
-# Conversation History
-if st.session_state.conversation_history:
+                    st.caption(f"⏱️ Response time: {response_time:.2f} seconds")
+
+            else:
+                st.error("❌ No response generated. Please try again.")
+
+        except Exception as e:
+            st.error(f"❌ Error generating response: {str(e)}")
+            st.caption("This might be due to API limits, network issues, or content policy violations.")
+
+# Conversation History - isolated in a fragment so Streamlit reruns only
+# this block when history changes instead of replaying the whole script
+@st.fragment
+def render_history():
+    if not st.session_state.conversation_history:
+        return
     st.subheader("📚 Conversation History")
-    
-    for i, entry in enumerate(reversed(st.session_state.conversation_history)):
-        with st.expander(f"Q&A #{len(st.session_state.conversation_history) - i} - {entry['timestamp']}"):
+
+    for i, entry in enumerate(st.session_state.conversation_history[::-1], start=1):
+        if entry.get("is_summary"):
+            title = f"📜 Summary of earlier conversation - {entry['timestamp']}"
+        else:
+            title = f"Q&A #{i} (most recent first) - {entry['timestamp']}"
+        with st.expander(title):
             st.markdown(f"**Question:** {entry['question']}")
             st.markdown(f"**Answer:** {entry['answer']}")
             st.caption(f"Response time: {entry['response_time']:.2f}s")
 
+
+render_history()
+
 # Footer
 st.markdown("---")
 st.markdown("Built with ❤️ using Streamlit and Google Gemini AI")